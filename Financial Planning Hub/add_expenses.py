@@ -1,10 +1,13 @@
 import os
 import sqlite3
+import uuid
 import pandas as pd
 from datetime import datetime
 from dotenv import load_dotenv
 from twilio.rest import Client
 import streamlit as st
+import database
+import write_buffer
 
 # Load environment variables from .env file
 load_dotenv()
@@ -19,22 +22,11 @@ USER_PHONE_NUMBER = os.getenv('USER_PHONE_NUMBER')
 if not all([TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER, USER_PHONE_NUMBER]):
     raise ValueError("Twilio configuration is incomplete. Check your .env file.")
 
-# Connect to SQLite database
-conn = sqlite3.connect('expenses.db', check_same_thread=False)
+# Connect to SQLite database and create the expenses table if it doesn't exist
+conn = database.connect()
+database.init_db(conn)
 c = conn.cursor()
 
-# Create the expenses table if it doesn't exist
-c.execute('''
-    CREATE TABLE IF NOT EXISTS expenses (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        category TEXT,
-        amount REAL,
-        description TEXT,
-        date TEXT
-    )
-''')
-conn.commit()
-
 # Send SMS alert using Twilio
 def send_sms_alert(message):
     client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
@@ -55,8 +47,15 @@ def check_thresholds():
         'Stocks/Mutual Fund': 15000   # Added Stocks/Mutual Fund category
     }
 
-    # Fetch expenses grouped by category
-    c.execute('SELECT category, SUM(amount) FROM expenses GROUP BY category')
+    # Fetch expenses grouped by category; archived years come from their pre-aggregated totals
+    c.execute('''
+        SELECT category, SUM(total) FROM (
+            SELECT category, SUM(amount) AS total FROM expenses WHERE deleted_at IS NULL GROUP BY category
+            UNION ALL
+            SELECT category, SUM(amount) AS total FROM archive_daily GROUP BY category
+        )
+        GROUP BY category
+    ''')
     rows = c.fetchall()
 
     for category, total in rows:
@@ -99,9 +98,13 @@ def app():
             submit_button = st.form_submit_button(label='Add Expense')
 
             if submit_button:
-                c.execute('INSERT INTO expenses (category, amount, description, date) VALUES (?, ?, ?, ?)',
-                          (category, amount, description, date.strftime('%Y-%m-%d')))
-                conn.commit()
+                # Group-committed with other sessions' writes; returns once the expense is on disk
+                try:
+                    write_buffer.get_buffer().add_expense(category, amount, description, date.strftime('%Y-%m-%d'))
+                except (TimeoutError, sqlite3.Error) as e:
+                    # Nothing was saved, so submitting again will not create a duplicate
+                    st.error(f'The expense could not be saved, please try again: {e}')
+                    return
                 
                 # Blue color for "Expense Added" message
                 st.markdown(f"<div style='border: 2px solid blue; padding: 10px; background-color: #cce5ff; color: blue; border-radius: 5px;'>Expense added: {category} - ₹{amount} on {date.strftime('%Y-%m-%d')}</div>", unsafe_allow_html=True)
@@ -119,9 +122,10 @@ def app():
 
             # Check if the required columns exist, case-insensitive
             if all(col.lower() in [column.lower() for column in df.columns] for col in ['category', 'amount', 'description', 'date']):
-                for _, row in df.iterrows():
-                    c.execute('INSERT INTO expenses (category, amount, description, date) VALUES (?, ?, ?, ?)',
-                              (row['category'], row['amount'], row['description'], row['date']))
+                # Tag every row of this upload so the whole import can be deleted in one go
+                import_batch = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {uploaded_file.name} ({uuid.uuid4().hex[:8]})"
+                c.executemany('INSERT INTO expenses (category, amount, description, date, import_batch) VALUES (?, ?, ?, ?, ?)',
+                              [(row['category'], row['amount'], row['description'], row['date'], import_batch) for _, row in df.iterrows()])
                 conn.commit()
                 
                 # Blue color for success message
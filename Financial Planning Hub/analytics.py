@@ -0,0 +1,285 @@
+import os
+import threading
+import pandas as pd
+import database
+import archive
+
+# DuckDB is optional; without it the aggregations run as GROUP BY queries in SQLite
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+BACKEND = os.getenv('ANALYTICS_BACKEND', 'duckdb' if duckdb else 'sqlite')
+
+# SQL expressions that truncate the TEXT date column; they work in both SQLite and DuckDB
+BUCKETS = {
+    'day': 'date',
+    'month': "substr(date, 1, 7) || '-01'",
+    'year': "substr(date, 1, 4) || '-01-01'",
+}
+
+_lock = threading.Lock()
+_engine = None
+_catalog = None
+
+# Attach the live database to an in-memory DuckDB; it scans SQLite with its vectorized engine
+def connect_duckdb():
+    if duckdb is None:
+        raise ImportError('ANALYTICS_BACKEND=duckdb requires the duckdb package.')
+    engine = duckdb.connect()
+    engine.execute('INSTALL sqlite')
+    engine.execute('LOAD sqlite')
+    engine.execute(f"ATTACH '{database.DATABASE_NAME}' AS expenses_db (TYPE SQLITE, READ_ONLY)")
+    return engine
+
+# Open the analytical engine once per process
+def get_engine():
+    global _engine, BACKEND
+    with _lock:
+        if _engine is None:
+            if BACKEND == 'duckdb':
+                try:
+                    _engine = connect_duckdb()
+                except Exception as e:
+                    # The sqlite extension is downloaded on first use; keep the dashboard working without it
+                    print(f'DuckDB unavailable, using SQLite for analytics: {e}')
+                    BACKEND = 'sqlite'
+            if _engine is None:
+                _engine = database.connect()
+        return _engine
+
+# SQLite connection used to look up archive partitions
+def get_catalog():
+    global _catalog
+    with _lock:
+        if _catalog is None:
+            _catalog = database.connect()
+        return _catalog
+
+# Run a query on the configured backend and return a DataFrame
+def run_query(sql, params=()):
+    engine = get_engine()
+    if BACKEND == 'duckdb':
+        # DuckDB connections are not shared between threads; each query gets its own cursor
+        return engine.cursor().execute(sql, list(params)).df()
+    return pd.read_sql(sql, engine, params=list(params))
+
+# Name of the expenses table as seen by the backend
+def expenses_table():
+    # Opening the engine first settles which backend is actually in use
+    get_engine()
+    return 'expenses_db.expenses' if BACKEND == 'duckdb' else 'expenses'
+
+# Build the WHERE clause shared by all aggregations; cold partitions hold no tombstones
+def date_filter(start_date=None, end_date=None, hot=True):
+    clauses = ['deleted_at IS NULL'] if hot else ['1 = 1']
+    params = []
+    if start_date:
+        clauses.append('date >= ?')
+        params.append(str(start_date))
+    if end_date:
+        clauses.append('date <= ?')
+        params.append(str(end_date))
+    return ' AND '.join(clauses), params
+
+# Daily totals per category, kept up to date from the expense_changes log
+class IncrementalAggregates:
+
+    def __init__(self, connect=database.connect):
+        self.connect = connect
+        self.conn = None
+        self.lock = threading.Lock()
+        self.checkpoint = None
+        self.totals = {}
+
+    def reload(self):
+        """Recompute every daily total and remember the change-log position it reflects."""
+        # One read transaction, so the scan and the checkpoint see the same snapshot
+        self.conn.execute('BEGIN')
+        try:
+            checkpoint = self.conn.execute('SELECT COALESCE(MAX(seq), 0) FROM expense_changes').fetchone()[0]
+            # Archived years come from their pre-aggregated totals, not from the cold files
+            rows = self.conn.execute('''
+                SELECT date, category, SUM(amount), SUM(count) FROM (
+                    SELECT date, category, SUM(amount) AS amount, COUNT(amount) AS count
+                    FROM expenses
+                    WHERE deleted_at IS NULL
+                    GROUP BY date, category
+                    UNION ALL
+                    SELECT date, category, amount, count FROM archive_daily
+                )
+                GROUP BY date, category
+            ''').fetchall()
+        finally:
+            self.conn.commit()
+
+        self.totals = {(date, category): [amount or 0, count] for date, category, amount, count in rows}
+        self.checkpoint = checkpoint
+
+    def refresh(self):
+        """Apply the changes logged since the last checkpoint and return the daily totals."""
+        with self.lock:
+            if self.conn is None:
+                self.conn = self.connect()
+
+            if self.checkpoint is not None:
+                oldest = self.conn.execute('SELECT MIN(seq) FROM expense_changes').fetchone()[0]
+                # Compaction pruned changes we have not seen yet; start over
+                if oldest is not None and oldest > self.checkpoint + 1:
+                    self.checkpoint = None
+            if self.checkpoint is None:
+                self.reload()
+                return self.frame()
+
+            changes = self.conn.execute('''
+                SELECT seq, date, category, amount, count
+                FROM expense_changes
+                WHERE seq > ?
+                ORDER BY seq
+            ''', (self.checkpoint,)).fetchall()
+
+            for seq, date, category, amount, count in changes:
+                total = self.totals.setdefault((date, category), [0, 0])
+                total[0] += amount
+                total[1] += count
+                if total[1] == 0:
+                    del self.totals[(date, category)]
+                self.checkpoint = seq
+
+            return self.frame()
+
+    def frame(self):
+        return pd.DataFrame(
+            [(date, category, amount, count) for (date, category), (amount, count) in self.totals.items()],
+            columns=['date', 'category', 'amount', 'expense_count'],
+        )
+
+_aggregates = IncrementalAggregates()
+
+# Truncate the cached daily totals to a coarser bucket
+def bucket_dates(dates, bucket):
+    if bucket == 'month':
+        return dates.str[:7] + '-01'
+    if bucket == 'year':
+        return dates.str[:4] + '-01-01'
+    return dates
+
+# Run a query over the hot table plus the cold partitions the date range reaches.
+# The SQL takes {table} and {where}; results from each source are returned stacked
+def query_partitions(sql, start_date=None, end_date=None):
+    where, params = date_filter(start_date, end_date)
+    frames = [run_query(sql.format(table=expenses_table(), where=where), params)]
+
+    cold_where, cold_params = date_filter(start_date, end_date, hot=False)
+    start_date = str(start_date) if start_date else None
+    end_date = str(end_date) if end_date else None
+    for path in archive.partitions_for(get_catalog(), start_date, end_date):
+        cold = archive.open_partition(path)
+        try:
+            frames.append(pd.read_sql(sql.format(table='expenses', where=cold_where), cold, params=cold_params))
+        finally:
+            cold.close()
+
+    # An empty slice has object columns and would turn every stacked column into object
+    return pd.concat([frame for frame in frames if not frame.empty] or frames[:1], ignore_index=True)
+
+# Total amount and number of expenses per category
+def category_summary(start_date=None, end_date=None):
+    if not (start_date or end_date):
+        daily = _aggregates.refresh()
+        return (daily.groupby('category', as_index=False)
+                .agg(total_amount=('amount', 'sum'), expense_count=('expense_count', 'sum'))
+                .sort_values('category', ignore_index=True))
+
+    partial = query_partitions('''
+        SELECT category, SUM(amount) AS total_amount, COUNT(amount) AS expense_count
+        FROM {table}
+        WHERE {where}
+        GROUP BY category
+    ''', start_date, end_date)
+    return partial.groupby('category', as_index=False)[['total_amount', 'expense_count']].sum()
+
+# Total amount per category for each day, month or year
+def time_buckets(bucket='day', start_date=None, end_date=None):
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket '{bucket}'. Use one of: {', '.join(BUCKETS)}.")
+    if not (start_date or end_date):
+        daily = _aggregates.refresh()
+        daily['date'] = bucket_dates(daily['date'], bucket)
+        return (daily.groupby(['date', 'category'], as_index=False)[['amount', 'expense_count']].sum()
+                .sort_values(['date', 'category'], ignore_index=True))
+
+    partial = query_partitions(f'''
+        SELECT {BUCKETS[bucket]} AS date, category, SUM(amount) AS amount, COUNT(amount) AS expense_count
+        FROM {{table}}
+        WHERE {{where}}
+        GROUP BY 1, 2
+    ''', start_date, end_date)
+    return partial.groupby(['date', 'category'], as_index=False)[['amount', 'expense_count']].sum()
+
+# The most recent expenses, for tables that cannot show the whole history
+def recent_expenses(limit=30):
+    sql = '''
+        SELECT id, category, amount, description, date
+        FROM {table}
+        WHERE {where}
+        ORDER BY date DESC, id DESC
+        LIMIT {limit}
+    '''
+    rows = run_query(sql.format(table=expenses_table(), where='deleted_at IS NULL', limit=int(limit)))
+
+    # Reach into the newest cold partitions only when the hot table is nearly empty
+    for path in reversed(archive.partitions_for(get_catalog())):
+        if len(rows) >= limit:
+            break
+        cold = archive.open_partition(path)
+        try:
+            older = pd.read_sql(sql.format(table='expenses', where='1 = 1', limit=int(limit) - len(rows)), cold)
+        finally:
+            cold.close()
+        rows = pd.concat([rows, older], ignore_index=True)
+
+    return rows
+
+# Date of the newest expense, live or archived, or None when there are none
+def latest_date():
+    hot = run_query(f'SELECT MAX(date) AS date FROM {expenses_table()} WHERE deleted_at IS NULL AND {archive.ISO_DATE}')
+    archived = get_catalog().execute('SELECT MAX(date) FROM archive_daily').fetchone()[0]
+    dates = [value for value in (hot['date'].iloc[0], archived) if isinstance(value, str)]
+    return max(dates) if dates else None
+
+# Total spent per description since a date, largest first
+def top_descriptions(start_date=None, limit=10):
+    partial = query_partitions('''
+        SELECT description, SUM(amount) AS total_amount, COUNT(amount) AS expense_count
+        FROM {table}
+        WHERE {where}
+        GROUP BY description
+    ''', start_date)
+    totals = partial.groupby('description', as_index=False)[['total_amount', 'expense_count']].sum()
+    return totals.sort_values('total_amount', ascending=False).head(limit).reset_index(drop=True)
+
+# Mean and standard deviation of single expenses per category since a date
+def category_stats(start_date=None):
+    partial = query_partitions('''
+        SELECT category, COUNT(amount) AS n, SUM(amount) AS total, SUM(amount * amount) AS squares
+        FROM {table}
+        WHERE {where}
+        GROUP BY category
+    ''', start_date)
+    stats = partial.groupby('category', as_index=False)[['n', 'total', 'squares']].sum()
+    stats['mean'] = stats['total'] / stats['n']
+    stats['std'] = (stats['squares'] / stats['n'] - stats['mean'] ** 2).clip(lower=0) ** 0.5
+    return stats[['category', 'n', 'mean', 'std']]
+
+# The largest single expenses since a date
+def largest_expenses(start_date=None, limit=50):
+    partial = query_partitions(f'''
+        SELECT id, category, amount, description, date
+        FROM {{table}}
+        WHERE {{where}}
+        ORDER BY amount DESC
+        LIMIT {int(limit)}
+    ''', start_date)
+    return partial.sort_values('amount', ascending=False).head(limit).reset_index(drop=True)
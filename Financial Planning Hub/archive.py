@@ -0,0 +1,162 @@
+import os
+import sqlite3
+from pathlib import Path
+import database
+from datetime import date, datetime, timedelta
+
+# Directory of the expenses database; archive paths are resolved against it, not the working directory
+DATABASE_DIR = os.path.dirname(os.path.abspath(database.DATABASE_NAME))
+
+# Directory holding one SQLite file per archived year
+ARCHIVE_DIR = os.path.join(DATABASE_DIR, os.getenv('ARCHIVE_DIR', 'archive'))
+
+# Years kept in the hot table: the current year and the one before it
+HOT_YEARS = 2
+
+# Minimum time between two archival runs
+ARCHIVAL_INTERVAL = timedelta(days=1)
+
+COLD_COLUMNS = 'id, category, amount, description, date'
+
+# Partition name and file for one year
+def partition_name(year):
+    return f'expenses_{year}'
+
+def partition_path(year):
+    return os.path.join(ARCHIVE_DIR, f'{partition_name(year)}.db')
+
+# The catalog stores paths relative to the database, so the data directory can be moved as a whole
+def catalog_path(path):
+    try:
+        return os.path.relpath(path, DATABASE_DIR)
+    except ValueError:
+        # On Windows a partition on another drive has no relative path
+        return path
+
+# First day that stays hot; everything before it belongs to a closed year
+def archive_cutoff(today=None, hot_years=HOT_YEARS):
+    today = today or date.today()
+    return date(today.year - hot_years + 1, 1, 1).isoformat()
+
+# Only ISO dates can be placed in a year; anything else (e.g. 01/12/2024 from a CSV) stays hot
+ISO_DATE = "date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*'"
+
+# Move live expenses dated before the cutoff into per-year cold partitions
+def archive_before(conn, cutoff):
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    years = [row[0] for row in conn.execute(f'''
+        SELECT DISTINCT substr(date, 1, 4) FROM expenses
+        WHERE deleted_at IS NULL AND {ISO_DATE} AND date < ?
+    ''', (cutoff,))]
+
+    archived = {}
+    for year in sorted(years):
+        archived[year] = archive_year(conn, year, min(cutoff, f'{int(year) + 1}-01-01'))
+    return archived
+
+# Move one year's expenses (up to the cutoff) into its partition
+def archive_year(conn, year, cutoff):
+    name, path = partition_name(year), partition_path(year)
+    where = f'deleted_at IS NULL AND {ISO_DATE} AND date >= ? AND date < ?'
+    params = (f'{year}-01-01', cutoff)
+
+    # The write lock is held from before the checkpoint until the hot rows are gone, so no
+    # other session can add, change or undo a matching row, or log a change, in between
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        checkpoint = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM expense_changes').fetchone()[0]
+
+        # With WAL, a transaction over two files is atomic per file only, so the cold copy is
+        # committed first on its own connection; INSERT OR REPLACE makes a re-run after a crash safe
+        cold = sqlite3.connect(path)
+        try:
+            # Only the columns reports need; tombstone and import bookkeeping stay behind
+            cold.execute('''
+                CREATE TABLE IF NOT EXISTS expenses (
+                    id INTEGER PRIMARY KEY,
+                    category TEXT,
+                    amount REAL,
+                    description TEXT,
+                    date TEXT
+                )
+            ''')
+            # Description search over archived years; the triggers keep it in sync as rows are copied
+            database.init_search_index(cold)
+            cold.commit()
+            # So INSERT OR REPLACE fires the delete trigger for the row it replaces
+            cold.execute('PRAGMA recursive_triggers=ON')
+            cold.execute('ATTACH DATABASE ? AS hot', (database_path(conn),))
+            with cold:
+                cold.execute(f'INSERT OR REPLACE INTO main.expenses SELECT {COLD_COLUMNS} FROM hot.expenses WHERE {where}',
+                             params)
+            cold.execute('DETACH DATABASE hot')
+            start_date, end_date, row_count = cold.execute(
+                'SELECT MIN(date), MAX(date), COUNT(*) FROM expenses').fetchone()
+        finally:
+            cold.close()
+
+        conn.execute(f'''
+            INSERT INTO archive_daily (partition, date, category, amount, count)
+            SELECT ?, date, category, COALESCE(SUM(amount), 0), COUNT(amount)
+            FROM expenses WHERE {where}
+            GROUP BY date, category
+            ON CONFLICT (partition, date, category)
+            DO UPDATE SET amount = amount + excluded.amount, count = count + excluded.count
+        ''', (name,) + params)
+        moved = conn.execute(f'DELETE FROM expenses WHERE {where}', params).rowcount
+        # The rows still count towards all-time totals, so the delete is not a change for aggregates
+        conn.execute('DELETE FROM expense_changes WHERE seq > ?', (checkpoint,))
+        conn.execute('''
+            INSERT OR REPLACE INTO archive_partitions (name, path, start_date, end_date, row_count)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (name, catalog_path(path), start_date, end_date, row_count))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    # Rewrite the partition densely packed; it is read-only from now on
+    cold = sqlite3.connect(path)
+    cold.execute('CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date)')
+    cold.commit()
+    cold.execute('VACUUM')
+    cold.close()
+    return moved
+
+# File behind a connection's main database
+def database_path(conn):
+    return next(row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main')
+
+# Archive closed years if the last run is older than the interval
+def archive_if_due(conn, interval=ARCHIVAL_INTERVAL):
+    row = conn.execute("SELECT last_run FROM maintenance WHERE task = 'archival'").fetchone()
+    if row and datetime.fromisoformat(row[0]) > datetime.now() - interval:
+        return None
+    archived = archive_before(conn, archive_cutoff())
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO maintenance (task, last_run) VALUES (?, ?)',
+                     ('archival', datetime.now().isoformat(timespec='seconds')))
+    return archived
+
+# Every archived year, oldest first
+def list_partitions(conn):
+    return conn.execute('''
+        SELECT name, path, start_date, end_date, row_count
+        FROM archive_partitions
+        ORDER BY start_date
+    ''').fetchall()
+
+# Cold partitions that hold rows inside the date range
+def partitions_for(conn, start_date=None, end_date=None):
+    rows = conn.execute('''
+        SELECT path FROM archive_partitions
+        WHERE (? IS NULL OR end_date >= ?) AND (? IS NULL OR start_date <= ?)
+        ORDER BY start_date
+    ''', (start_date, start_date, end_date, end_date)).fetchall()
+    return [row[0] for row in rows]
+
+# Open a cold partition read-only
+def open_partition(path):
+    # as_uri escapes spaces and other characters SQLite would read as URI syntax
+    uri = Path(DATABASE_DIR, path).as_uri()
+    return sqlite3.connect(f'{uri}?mode=ro', uri=True, check_same_thread=False)
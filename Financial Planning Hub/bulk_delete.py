@@ -0,0 +1,153 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+import archive
+
+# Tombstones older than this are purged by compaction
+TOMBSTONE_RETENTION = timedelta(days=7)
+
+# Minimum time between two compaction runs
+COMPACTION_INTERVAL = timedelta(hours=6)
+
+# How often the background compactor checks whether a run is due
+COMPACTION_POLL_SECONDS = 15 * 60
+
+# Change-log entries kept for incremental dashboard refresh; older readers reload from scratch
+CHANGE_LOG_RETENTION = 100000
+
+# Pages freed per incremental_vacuum step, so each write lock is held briefly
+VACUUM_PAGES_PER_STEP = 500
+
+_compactor_lock = threading.Lock()
+_compactor_started = False
+
+# Build the WHERE clause for a delete filter
+def build_filter(ids=None, start_date=None, end_date=None, categories=None, import_batch=None):
+    clauses = ['deleted_at IS NULL']
+    params = []
+
+    if ids:
+        clauses.append(f"id IN ({', '.join('?' * len(ids))})")
+        params.extend(int(expense_id) for expense_id in ids)
+    if start_date:
+        clauses.append('date >= ?')
+        params.append(str(start_date))
+    if end_date:
+        clauses.append('date <= ?')
+        params.append(str(end_date))
+    if categories:
+        clauses.append(f"category IN ({', '.join('?' * len(categories))})")
+        params.extend(categories)
+    if import_batch:
+        clauses.append('import_batch = ?')
+        params.append(import_batch)
+
+    # Refuse to match the whole table by accident
+    if len(clauses) == 1:
+        raise ValueError('At least one filter is required for a bulk delete.')
+
+    return ' AND '.join(clauses), params
+
+# Count the expenses a filter would delete
+def count_matching(conn, **filters):
+    where, params = build_filter(**filters)
+    return conn.execute(f'SELECT COUNT(*) FROM expenses WHERE {where}', params).fetchone()[0]
+
+# Count archived expenses a date or category filter reaches; archived years are read-only.
+# Archived rows keep no import batch, so a batch filter never reaches them
+def count_archived(conn, ids=None, start_date=None, end_date=None, categories=None, import_batch=None):
+    if ids or import_batch or not (start_date or end_date or categories):
+        return 0
+
+    clauses, params = ['1 = 1'], []
+    if start_date:
+        clauses.append('date >= ?')
+        params.append(str(start_date))
+    if end_date:
+        clauses.append('date <= ?')
+        params.append(str(end_date))
+    if categories:
+        clauses.append(f"category IN ({', '.join('?' * len(categories))})")
+        params.extend(categories)
+
+    # The catalog's daily counts answer this without opening any cold partition
+    return conn.execute(f"SELECT COALESCE(SUM(count), 0) FROM archive_daily WHERE {' AND '.join(clauses)}",
+                        params).fetchone()[0]
+
+# Soft-delete every expense matching the filter in a single statement
+def soft_delete(conn, **filters):
+    where, params = build_filter(**filters)
+    token = uuid.uuid4().hex
+    now = datetime.now().isoformat(timespec='seconds')
+    with conn:
+        cursor = conn.execute(f'UPDATE expenses SET deleted_at = ?, delete_token = ? WHERE {where}',
+                              [now, token] + params)
+    return token, cursor.rowcount
+
+# Restore the expenses removed by a previous soft delete
+def undo_delete(conn, token):
+    with conn:
+        cursor = conn.execute('UPDATE expenses SET deleted_at = NULL, delete_token = NULL WHERE delete_token = ?',
+                              (token,))
+    return cursor.rowcount
+
+# List the import batches that still have live expenses
+def list_import_batches(conn):
+    rows = conn.execute('''
+        SELECT import_batch FROM expenses
+        WHERE import_batch IS NOT NULL AND deleted_at IS NULL
+        GROUP BY import_batch
+        ORDER BY import_batch DESC
+    ''').fetchall()
+    return [row[0] for row in rows]
+
+# Purge old tombstones and give the freed pages back to the filesystem
+def compact(conn, retention=TOMBSTONE_RETENTION):
+    cutoff = (datetime.now() - retention).isoformat(timespec='seconds')
+    with conn:
+        purged = conn.execute('DELETE FROM expenses WHERE deleted_at IS NOT NULL AND deleted_at < ?',
+                              (cutoff,)).rowcount
+        conn.execute('DELETE FROM expense_changes WHERE seq <= (SELECT MAX(seq) FROM expense_changes) - ?',
+                     (CHANGE_LOG_RETENTION,))
+
+    # Vacuum in small steps; with WAL, readers are never blocked and writers only wait one step
+    while conn.execute('PRAGMA freelist_count').fetchone()[0] > 0:
+        conn.execute(f'PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})').fetchall()
+        conn.commit()
+
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO maintenance (task, last_run) VALUES (?, ?)',
+                     ('compaction', datetime.now().isoformat(timespec='seconds')))
+    return purged
+
+# Run compaction if the last run is older than the interval
+def compact_if_due(conn, interval=COMPACTION_INTERVAL):
+    row = conn.execute("SELECT last_run FROM maintenance WHERE task = 'compaction'").fetchone()
+    if row and datetime.fromisoformat(row[0]) > datetime.now() - interval:
+        return None
+    return compact(conn)
+
+# Start a daemon thread that archives closed years and compacts the database on a schedule
+def start_compactor(connect, interval=COMPACTION_INTERVAL):
+    global _compactor_started
+    with _compactor_lock:
+        if _compactor_started:
+            return
+        _compactor_started = True
+
+    def run():
+        # The compactor gets its own connection so it never shares a cursor with a page
+        conn = connect()
+        while True:
+            try:
+                archive.archive_if_due(conn)
+            except Exception as e:
+                print(f'Archival failed: {e}')
+            try:
+                compact_if_due(conn, interval)
+            except Exception as e:
+                print(f'Compaction failed: {e}')
+            time.sleep(COMPACTION_POLL_SECONDS)
+
+    threading.Thread(target=run, name='expense-compactor', daemon=True).start()
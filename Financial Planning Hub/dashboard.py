@@ -1,5 +1,4 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import os
 import plotly.express as px
@@ -10,6 +9,9 @@ from io import BytesIO
 from dotenv import load_dotenv
 import google.generativeai as genai
 import re
+import database
+import analytics
+import report_prompt
 
 # Load environment variables from .env file
 load_dotenv()
@@ -19,29 +21,22 @@ api_key = os.getenv("GOOGLE_GENAI_API_KEY")
 genai.configure(api_key=api_key)
 
 # Create or connect to an SQLite database
-conn = sqlite3.connect('expenses.db', check_same_thread=False)
+conn = database.connect()
+database.init_db(conn)
 c = conn.cursor()
 
-# Retrieve expenses data from the database
+# Retrieve daily spending per category; the aggregation runs in the database, not in pandas
 def get_expenses_data():
-    query = "SELECT * FROM expenses"
-    df = pd.read_sql(query, conn)
-    return df
+    return analytics.time_buckets('day')
 
 # Function to remove unwanted symbols
 def clean_report(report_text):
     cleaned_text = re.sub(r'[^\w\s.,!?]', '', report_text)
     return cleaned_text
 
-def generate_report(salary, expenses_summary):
-    prompt = f"""
-    I have the following expenses summary:
-    {expenses_summary}
-
-    My monthly salary is: {salary}
-
-    Please create a financial report summarizing my expenses and how much I can save from my salary. Include insights on spending patterns, possible savings, and suggestions on managing finances better.
-    """
+def generate_report(salary, token_budget=report_prompt.TOKEN_BUDGET):
+    # Compact statistics sized to the token budget, so the prompt stays flat as history grows
+    prompt = report_prompt.build_prompt(salary, token_budget)
     
     model = genai.GenerativeModel(model_name="gemini-1.5-flash")
     response = model.generate_content(prompt)
@@ -51,24 +46,23 @@ def generate_report(salary, expenses_summary):
     return cleaned_report
 
 # Generate the plots using Plotly (for Web App)
-def create_plotly_plots(df):
+def create_plotly_plots(df, category_sum):
     # Scatter Plot with color coding
     scatter_fig = px.scatter(df, x='date', y='amount', color='category', title="Scatter Plot of Spending Over Time", labels={'date': 'Date', 'amount': 'Amount'})
 
     # Pie Chart (Proportions by Category)
-    category_sum = df.groupby('category')['amount'].sum().reset_index()
-    pie_fig = px.pie(category_sum, names='category', values='amount', title='Proportion of Spending by Category')
+    pie_fig = px.pie(category_sum, names='category', values='total_amount', title='Proportion of Spending by Category')
 
     # Bar Plot (Total Spending by Category) with different colors for each category
-    bar_fig = px.bar(category_sum, x='category', y='amount', title='Total Spending by Category', 
-                     labels={'category': 'Category', 'amount': 'Total Amount'},
+    bar_fig = px.bar(category_sum, x='category', y='total_amount', title='Total Spending by Category', 
+                     labels={'category': 'Category', 'total_amount': 'Total Amount'},
                      color='category',  # Assign colors based on the 'category' column
                      color_discrete_sequence=px.colors.qualitative.Set1)  # Use a predefined color set
 
     return scatter_fig, pie_fig, bar_fig
 
 
-def create_matplotlib_plots(df):
+def create_matplotlib_plots(df, category_sum):
     # Ensure that the 'date' column is in datetime format
     df['date'] = pd.to_datetime(df['date'])
     
@@ -116,9 +110,8 @@ def create_matplotlib_plots(df):
     scatter_image.seek(0)
     
     # Pie Chart (Proportions by Category)
-    category_sum = df.groupby('category')['amount'].sum().reset_index()
     fig, ax = plt.subplots(figsize=(8.5, 3))
-    ax.pie(category_sum['amount'], labels=category_sum['category'], autopct='%1.1f%%', startangle=90)
+    ax.pie(category_sum['total_amount'], labels=category_sum['category'], autopct='%1.1f%%', startangle=90)
     ax.axis('equal')
     ax.set_title('Proportion of Spending by Category')
 
@@ -128,7 +121,7 @@ def create_matplotlib_plots(df):
 
     # Bar Plot (Total Spending by Category)
     fig, ax = plt.subplots(figsize=(8.5, 3))
-    ax.bar(category_sum['category'], category_sum['amount'], color='skyblue')
+    ax.bar(category_sum['category'], category_sum['total_amount'], color='skyblue')
     ax.set_xlabel('Category')
     ax.set_ylabel('Total Amount')
     ax.set_title('Total Spending by Category')
@@ -163,9 +156,9 @@ def save_pdf(report, scatter_image, pie_image, bar_image, expenses_summary, expe
         pdf.savefig(fig)
         plt.close(fig)
 
-        # Second page: Insert Table 2 (Detailed Expenses)
+        # Second page: Insert Table 2 (Most Recent Expenses)
         fig, ax = plt.subplots(figsize=(8.5, 11))
-        ax.text(0.5, 0.95, 'Detailed Expenses Table', ha='center', va='top', fontsize=16)
+        ax.text(0.5, 0.95, 'Recent Expenses Table', ha='center', va='top', fontsize=16)
         ax.axis('off')
         ax.table(cellText=expenses_df.values, colLabels=expenses_df.columns, loc='center', cellLoc='center')
 
@@ -191,15 +184,17 @@ def app():
     if st.session_state.get('signedout') and st.session_state.get('username'):
         st.success(f"Welcome, {st.session_state['username']}!")
 
-        # Fetch expenses data from the database
+        # Fetch aggregated expenses data from the database
         df = get_expenses_data()
 
         if df.empty:
             st.warning('No expense data available.')
             return
 
+        expenses_summary = analytics.category_summary()
+
         # Generate the Plotly charts for the web app
-        scatter_fig, pie_fig, bar_fig = create_plotly_plots(df)
+        scatter_fig, pie_fig, bar_fig = create_plotly_plots(df, expenses_summary)
 
         # Display the scatter plot
         st.write('### Scatter Plot (Amount vs Date)')
@@ -213,19 +208,14 @@ def app():
         st.write('### Total Spending by Category')
         st.plotly_chart(bar_fig)
 
-        expenses_summary = df.groupby('category').agg(
-            total_amount=('amount', 'sum'),
-            expense_count=('amount', 'count')
-        ).reset_index()
-
         salary = st.number_input("Enter your monthly salary:", min_value=0, step=1000)
 
         if st.button("Generate Financial Report"):
             if salary > 0:
-                report = generate_report(salary, expenses_summary)
+                report = generate_report(salary)
                 st.text_area("Generated Report", value=report, height=300)
-                scatter_image, pie_image, bar_image = create_matplotlib_plots(df)
-                pdf_output = save_pdf(report, scatter_image, pie_image, bar_image, expenses_summary, df)
+                scatter_image, pie_image, bar_image = create_matplotlib_plots(df, expenses_summary)
+                pdf_output = save_pdf(report, scatter_image, pie_image, bar_image, expenses_summary, analytics.recent_expenses())
                 st.download_button(
                     label="Download Report as PDF",
                     data=pdf_output,
@@ -0,0 +1,165 @@
+import os
+import sqlite3
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+DATABASE_NAME = os.getenv('DATABASE_NAME', 'expenses.db')
+
+# Seconds a connection waits on a locked database before raising "database is locked"
+DATABASE_TIMEOUT = float(os.getenv('DATABASE_TIMEOUT', '30'))
+
+# Open a connection to the expenses database
+def connect(database=DATABASE_NAME):
+    conn = sqlite3.connect(database, check_same_thread=False, timeout=DATABASE_TIMEOUT)
+    # WAL lets readers keep going while a writer (or the compactor) holds the lock
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+# Add a column to a table if an older database does not have it yet
+def add_column(conn, table, column, definition):
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+# Create the expenses table and bring older databases up to date
+def init_db(conn):
+    # auto_vacuum only takes effect on an empty database or after a full VACUUM
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT,
+            amount REAL,
+            description TEXT,
+            date TEXT
+        )
+    ''')
+
+    # Columns used by bulk import and soft delete
+    add_column(conn, 'expenses', 'import_batch', 'TEXT')
+    add_column(conn, 'expenses', 'deleted_at', 'TEXT')
+    add_column(conn, 'expenses', 'delete_token', 'TEXT')
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses (category)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_import_batch ON expenses (import_batch)')
+    # Partial indexes stay tiny because only tombstoned rows are in them
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_deleted_at ON expenses (deleted_at) WHERE deleted_at IS NOT NULL')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_delete_token ON expenses (delete_token) WHERE delete_token IS NOT NULL')
+
+    init_search_index(conn)
+    init_change_log(conn)
+    init_archive_catalog(conn)
+
+    # Bookkeeping for scheduled maintenance jobs
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance (
+            task TEXT PRIMARY KEY,
+            last_run TEXT
+        )
+    ''')
+    conn.commit()
+
+# Full-text index over expense descriptions, kept in sync by triggers
+def init_search_index(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'expenses_fts'").fetchone()
+
+    # External-content table: the text lives in expenses, the index only stores tokens.
+    # prefix='2 3' adds prefix indexes so "air*" style queries don't scan the vocabulary
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+            description,
+            content='expenses',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN
+            INSERT INTO expenses_fts (rowid, description) VALUES (new.id, new.description);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, description) VALUES ('delete', old.id, old.description);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF description ON expenses BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, description) VALUES ('delete', old.id, old.description);
+            INSERT INTO expenses_fts (rowid, description) VALUES (new.id, new.description);
+        END
+    ''')
+
+    # Index the expenses that were added before the index existed
+    if not exists:
+        conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+
+# Append-only log of changes to live expenses, fed by triggers.
+# Each row is a signed delta, so aggregates can be updated without rescanning expenses
+def init_change_log(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS expense_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            expense_id INTEGER,
+            category TEXT,
+            date TEXT,
+            amount REAL,
+            count INTEGER
+        )
+    ''')
+    # Soft-deleted rows are already gone as far as aggregates are concerned
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS expense_changes_insert AFTER INSERT ON expenses
+        WHEN new.deleted_at IS NULL BEGIN
+            INSERT INTO expense_changes (expense_id, category, date, amount, count)
+            VALUES (new.id, new.category, new.date, COALESCE(new.amount, 0), new.amount IS NOT NULL);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS expense_changes_delete AFTER DELETE ON expenses
+        WHEN old.deleted_at IS NULL BEGIN
+            INSERT INTO expense_changes (expense_id, category, date, amount, count)
+            VALUES (old.id, old.category, old.date, -COALESCE(old.amount, 0), -(old.amount IS NOT NULL));
+        END
+    ''')
+    # An update is logged as removing the old row and adding the new one; this also covers delete and undo
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS expense_changes_update AFTER UPDATE OF category, amount, date, deleted_at ON expenses BEGIN
+            INSERT INTO expense_changes (expense_id, category, date, amount, count)
+            SELECT old.id, old.category, old.date, -COALESCE(old.amount, 0), -(old.amount IS NOT NULL)
+            WHERE old.deleted_at IS NULL;
+            INSERT INTO expense_changes (expense_id, category, date, amount, count)
+            SELECT new.id, new.category, new.date, COALESCE(new.amount, 0), new.amount IS NOT NULL
+            WHERE new.deleted_at IS NULL;
+        END
+    ''')
+
+# Catalog of cold archive partitions and their pre-aggregated daily totals
+def init_archive_catalog(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_partitions (
+            name TEXT PRIMARY KEY,
+            path TEXT,
+            start_date TEXT,
+            end_date TEXT,
+            row_count INTEGER
+        )
+    ''')
+    # Totals over archived rows, so all-time aggregates never have to open a cold partition
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_daily (
+            partition TEXT,
+            date TEXT,
+            category TEXT,
+            amount REAL,
+            count INTEGER,
+            PRIMARY KEY (partition, date, category)
+        )
+    ''')
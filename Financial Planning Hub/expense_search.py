@@ -0,0 +1,68 @@
+import re
+import pandas as pd
+import archive
+
+COLUMNS = ['ID', 'Category', 'Amount', 'Description', 'Date', 'Archived']
+
+# Turn free text into an FTS5 query where every word is matched as a prefix
+def build_match(query):
+    words = re.findall(r'\w+', query)
+    # Quoting each word keeps FTS5 operators and punctuation in user input from breaking the query
+    return ' '.join(f'"{word}"*' for word in words)
+
+# Matches counted and ranked per search; past this the count shows as "1000+" and only the
+# newest matches are ranked, so a one-letter query costs the same as a precise one
+MATCH_LIMIT = 1000
+
+# Match count (capped just above MATCH_LIMIT) and the best `limit` matches, with their rank, from one database
+def search_source(conn, match, limit, archived):
+    # Cold partitions hold no tombstones, so only the hot table needs the filter
+    live = '' if archived else 'AND e.deleted_at IS NULL'
+    total = conn.execute(f'''
+        SELECT COUNT(*) FROM (
+            SELECT 1
+            FROM expenses_fts JOIN expenses e ON e.id = expenses_fts.rowid
+            WHERE expenses_fts MATCH ? {live}
+            LIMIT ?
+        )
+    ''', (match, MATCH_LIMIT + 1)).fetchone()[0]
+
+    # FTS5 walks matches in rowid order and scores only the rows it returns, so bm25 is
+    # computed for at most MATCH_LIMIT of the newest matches before they are sorted
+    rows = conn.execute(f'''
+        SELECT id, category, amount, description, date, ?, rank FROM (
+            SELECT e.id, e.category, e.amount, e.description, e.date, expenses_fts.rank AS rank
+            FROM expenses_fts JOIN expenses e ON e.id = expenses_fts.rowid
+            WHERE expenses_fts MATCH ? {live}
+            ORDER BY expenses_fts.rowid DESC
+            LIMIT ?
+        )
+        ORDER BY rank
+        LIMIT ?
+    ''', (archived, match, MATCH_LIMIT, limit)).fetchall()
+    return total, rows
+
+# Search expense descriptions in the hot table and every archived year, best matches first, one page at a time.
+# Each year's index scores with its own statistics, so the order across archived years is approximate
+def search_expenses(conn, query, page=1, page_size=20):
+    match = build_match(query)
+    if not match:
+        return pd.DataFrame(columns=COLUMNS), 0
+
+    # Each source only has to supply enough rows to fill the pages up to the requested one
+    depth = min(page * page_size, MATCH_LIMIT)
+    total, rows = search_source(conn, match, depth, archived=False)
+
+    for path in archive.partitions_for(conn):
+        cold = archive.open_partition(path)
+        try:
+            if cold.execute("SELECT 1 FROM sqlite_master WHERE name = 'expenses_fts'").fetchone():
+                cold_total, cold_rows = search_source(cold, match, depth, archived=True)
+                total += cold_total
+                rows += cold_rows
+        finally:
+            cold.close()
+
+    rows.sort(key=lambda row: row[-1])
+    page_rows = [row[:-1] for row in rows[(page - 1) * page_size:depth]]
+    return pd.DataFrame(page_rows, columns=COLUMNS).astype({'Archived': bool}), min(total, MATCH_LIMIT + 1)
@@ -0,0 +1,213 @@
+import random
+import sys
+import threading
+import time
+import types
+from collections import Counter
+from datetime import date
+
+# Raised by the fake backends when error injection fires
+class InjectedError(Exception):
+    pass
+
+# Latency and error behaviour of one fake backend
+class ServiceProfile:
+
+    def __init__(self, name, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def call(self):
+        """Sleep for the configured latency and fail at the configured rate."""
+        with self.lock:
+            self.calls += 1
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.error_rate:
+            with self.lock:
+                self.errors += 1
+            raise InjectedError(f'{self.name}: injected failure')
+
+# --- Streamlit ---------------------------------------------------------------
+
+# Raised by st.rerun(); Streamlit's own rerun exception is not an Exception subclass either
+class RerunRequested(BaseException):
+    pass
+
+# Session state that, like Streamlit's, supports both item and attribute access
+class SessionState(dict):
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+# Swallows every call; stands in for containers, charts and placeholders
+class Noop:
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def __getattr__(self, name):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+# One simulated browser session: its state and the widget values it "types in"
+class Session:
+
+    def __init__(self, name):
+        self.name = name
+        self.state = SessionState()
+        self.inputs = {}
+        self.messages = Counter()
+        self.errors = []
+
+# Headless stand-in for the streamlit module; each thread drives its own Session
+class FakeStreamlit(types.ModuleType):
+
+    def __init__(self):
+        super().__init__('streamlit')
+        self._local = threading.local()
+
+    def use_session(self, session):
+        self._local.session = session
+
+    @property
+    def session(self):
+        return self._local.session
+
+    @property
+    def session_state(self):
+        return self.session.state
+
+    def widget(self, label, default, key=None):
+        if key is not None and key in self.session.state:
+            return self.session.state[key]
+        value = self.session.inputs.get(label, default)
+        if key is not None:
+            self.session.state[key] = value
+        return value
+
+    def selectbox(self, label, options, index=0, **kwargs):
+        return self.widget(label, options[index] if options else None, kwargs.get('key'))
+
+    def multiselect(self, label, options, default=None, **kwargs):
+        return self.widget(label, list(default or []), kwargs.get('key'))
+
+    def number_input(self, label, min_value=None, max_value=None, value=None, step=None, **kwargs):
+        return self.widget(label, value if value is not None else (min_value or 0), kwargs.get('key'))
+
+    def text_input(self, label, value='', **kwargs):
+        return self.widget(label, value, kwargs.get('key'))
+
+    def date_input(self, label, value=None, **kwargs):
+        return self.widget(label, value or date.today(), kwargs.get('key'))
+
+    def checkbox(self, label, value=False, **kwargs):
+        return self.widget(label, value, kwargs.get('key'))
+
+    def button(self, label, **kwargs):
+        if kwargs.get('disabled'):
+            return False
+        return self.widget(label, False)
+
+    def form_submit_button(self, label='Submit', **kwargs):
+        return self.widget(label, False)
+
+    def file_uploader(self, label, **kwargs):
+        return self.widget(label, None)
+
+    def error(self, body, *args, **kwargs):
+        self.session.errors.append(str(body))
+
+    def rerun(self):
+        raise RerunRequested()
+
+    def __getattr__(self, name):
+        # warning, success, markdown, dataframe, plotly_chart, form, expander, ...
+        if name.startswith('__'):
+            raise AttributeError(name)
+        messages = self.session.messages if hasattr(self._local, 'session') else Counter()
+        messages[name] += 1
+        return Noop()
+
+# --- Twilio ------------------------------------------------------------------
+
+def make_twilio(profile):
+    class Messages:
+        def create(self, body, from_, to):
+            profile.call()
+            return types.SimpleNamespace(sid=f'SM{random.getrandbits(64):016x}', body=body)
+
+    class Client:
+        def __init__(self, account_sid, auth_token):
+            self.messages = Messages()
+
+    rest = types.ModuleType('twilio.rest')
+    rest.Client = Client
+    twilio = types.ModuleType('twilio')
+    twilio.rest = rest
+    return {'twilio': twilio, 'twilio.rest': rest}
+
+# --- Gemini ------------------------------------------------------------------
+
+def make_gemini(profile):
+    class GenerativeModel:
+        def __init__(self, model_name, **kwargs):
+            self.model_name = model_name
+
+        def generate_content(self, prompt):
+            profile.call()
+            return types.SimpleNamespace(text=f'Financial report ({len(prompt)} prompt characters).')
+
+    genai = types.ModuleType('google.generativeai')
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = GenerativeModel
+    google = types.ModuleType('google')
+    google.generativeai = genai
+    return {'google': google, 'google.generativeai': genai}
+
+# --- Firebase ----------------------------------------------------------------
+
+def make_firebase(profile):
+    credentials = types.ModuleType('firebase_admin.credentials')
+    credentials.Certificate = lambda path: types.SimpleNamespace(path=path)
+
+    firebase_admin = types.ModuleType('firebase_admin')
+    firebase_admin._apps = {}
+    firebase_admin.credentials = credentials
+
+    def initialize_app(cred=None, **kwargs):
+        firebase_admin._apps['[DEFAULT]'] = cred
+
+    # Mirrors the identitytoolkit signInWithPassword call made by account.py
+    def sign_in(email, password):
+        profile.call()
+        return {'email': email, 'username': email.split('@')[0]}
+
+    firebase_admin.initialize_app = initialize_app
+    firebase_admin.sign_in = sign_in
+    return {'firebase_admin': firebase_admin, 'firebase_admin.credentials': credentials}
+
+# Replace streamlit and the external services with the fakes; call before importing any page
+def install(twilio_profile, gemini_profile, firebase_profile):
+    st = FakeStreamlit()
+    modules = {'streamlit': st}
+    modules.update(make_twilio(twilio_profile))
+    modules.update(make_gemini(gemini_profile))
+    modules.update(make_firebase(firebase_profile))
+    sys.modules.update(modules)
+    return st, modules['firebase_admin']
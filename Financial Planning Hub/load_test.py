@@ -0,0 +1,195 @@
+"""Drive the Add Expenses, View Expenses and Dashboard pages from many concurrent sessions.
+
+Streamlit, Firebase, Twilio and Gemini are replaced by local fakes with configurable
+latency and error injection; the pages run against a copy of the expenses database.
+
+    python load_test.py --sessions 20 --duration 30 --gemini-latency 1.5 --twilio-error-rate 0.05
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+import fake_services
+
+PAGES = ['add_expenses', 'view_expenses', 'dashboard']
+
+CATEGORIES = ['Food', 'Transport', 'Utilities', 'Entertainment', 'Stocks/Mutual Fund', 'Others']
+
+WORDS = ['cab', 'airport', 'lunch', 'dinner', 'groceries', 'rent', 'movie', 'train', 'coffee', 'hotel']
+
+# Widget values a user would enter on each page
+def page_inputs(page, args):
+    if page == 'add_expenses':
+        return {
+            'Select how to add expenses:': 'Enter Data Manually',
+            'Select Category': random.choice(CATEGORIES),
+            'Amount': random.randint(1, 5000),
+            'Description': ' '.join(random.sample(WORDS, 3)),
+            'Date': date.today() - timedelta(days=random.randint(0, 365)),
+            'Add Expense': True,
+        }
+    if page == 'view_expenses':
+        search = random.random() < args.search_ratio
+        return {'Search descriptions': random.choice(WORDS)[:3] if search else ''}
+    return {
+        'Enter your monthly salary:': 50000,
+        'Generate Financial Report': random.random() < args.report_ratio,
+    }
+
+# Does this error come from SQLite lock contention?
+def is_lock_error(message):
+    return 'database is locked' in message or 'database table is locked' in message
+
+# Per-page latency, error and lock-contention counts shared by all sessions
+class Results:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock_errors = defaultdict(int)
+        self.messages = Counter()
+
+    def record(self, page, seconds, errors):
+        with self.lock:
+            self.latencies[page].append(seconds)
+            if errors:
+                self.errors[page] += 1
+            self.lock_errors[page] += sum(is_lock_error(error) for error in errors)
+            self.messages.update((page, error) for error in errors)
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+# One simulated user: log in through fake Firebase, then visit pages until time runs out
+def run_session(number, st, firebase, modules, results, args, deadline):
+    session = fake_services.Session(f'session-{number}')
+    st.use_session(session)
+
+    # Keep retrying the login, like a user would, when Firebase errors are injected
+    user = None
+    while user is None and time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            user = firebase.sign_in(f'loadtest{number}@example.com', 'password')
+            errors = []
+        except fake_services.InjectedError as e:
+            errors = [str(e)]
+        results.record('login', time.perf_counter() - start, errors)
+    if user is None:
+        return
+    session.state.update(username=user['username'], useremail=user['email'], signedout=True, signout=True)
+
+    while time.monotonic() < deadline:
+        page = random.choice(args.pages)
+        session.inputs = page_inputs(page, args)
+        session.errors = []
+
+        start = time.perf_counter()
+        try:
+            modules[page].app()
+        except fake_services.RerunRequested:
+            pass
+        except Exception as e:
+            # Pages that don't catch their own errors would show a Streamlit traceback
+            session.errors.append(f'{type(e).__name__}: {e}')
+        results.record(page, time.perf_counter() - start, session.errors)
+
+        if args.think_time:
+            time.sleep(random.uniform(0, 2 * args.think_time))
+
+def print_report(results, elapsed, profiles):
+    print(f"\n{'page':<15}{'runs':>8}{'runs/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'locked':>8}")
+    for page in sorted(results.latencies):
+        latencies = results.latencies[page]
+        print(f'{page:<15}{len(latencies):>8}{len(latencies) / elapsed:>10.1f}'
+              f'{percentile(latencies, 50) * 1000:>10.1f}{percentile(latencies, 99) * 1000:>10.1f}'
+              f'{results.errors[page]:>8}{results.lock_errors[page]:>8}')
+
+    if results.messages:
+        print('\nmost common errors:')
+        for (page, message), count in results.messages.most_common(5):
+            print(f'{count:>8}  {page}: {message}')
+
+    print(f"\n{'service':<15}{'calls':>8}{'errors':>8}")
+    for profile in profiles:
+        print(f'{profile.name:<15}{profile.calls:>8}{profile.errors:>8}')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=10, help='concurrent simulated sessions')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--pages', nargs='+', choices=PAGES, default=PAGES)
+    parser.add_argument('--database', default='expenses.db', help='database to copy as the starting data set')
+    parser.add_argument('--busy-timeout', type=float, default=5, help='seconds SQLite waits on a lock before failing')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean pause between page views')
+    parser.add_argument('--search-ratio', type=float, default=0.5, help='share of View Expenses visits that search')
+    parser.add_argument('--report-ratio', type=float, default=0.1, help='share of Dashboard visits that generate a report')
+    for service, latency in (('firebase', 0.1), ('twilio', 0.3), ('gemini', 2.0)):
+        parser.add_argument(f'--{service}-latency', type=float, default=latency, help=f'seconds per {service} call')
+        parser.add_argument(f'--{service}-jitter', type=float, default=latency / 2)
+        parser.add_argument(f'--{service}-error-rate', type=float, default=0.0)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    profiles = [
+        fake_services.ServiceProfile(service, getattr(args, f'{service}_latency'),
+                                     getattr(args, f'{service}_jitter'), getattr(args, f'{service}_error_rate'))
+        for service in ('twilio', 'gemini', 'firebase')
+    ]
+    st, firebase = fake_services.install(*profiles)
+
+    # Remove the database copy and its partitions even if the run fails or is interrupted
+    workdir = tempfile.mkdtemp(prefix='fph-loadtest-')
+    try:
+        run(args, st, firebase, profiles, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# Copy the database, start the sessions and print the report
+def run(args, st, firebase, profiles, workdir):
+    # Work on a copy so the run never touches real data
+    database_copy = os.path.join(workdir, 'expenses.db')
+    if os.path.exists(args.database):
+        source = sqlite3.connect(args.database)
+        with sqlite3.connect(database_copy) as target:
+            source.backup(target)
+        source.close()
+
+    os.environ.update({
+        'DATABASE_NAME': database_copy,
+        # View Expenses starts the archival job; keep its partitions with the copy
+        'ARCHIVE_DIR': os.path.join(workdir, 'archive'),
+        'DATABASE_TIMEOUT': str(args.busy_timeout),
+        'TWILIO_ACCOUNT_SID': 'ACloadtest',
+        'TWILIO_AUTH_TOKEN': 'loadtest',
+        'TWILIO_PHONE_NUMBER': '+10000000000',
+        'USER_PHONE_NUMBER': '+10000000001',
+    })
+
+    # Import the pages only now, so they pick up the fakes and the database copy
+    modules = {page: __import__(page) for page in PAGES}
+
+    results = Results()
+    deadline = time.monotonic() + args.duration
+    threads = [threading.Thread(target=run_session, args=(number, st, firebase, modules, results, args, deadline),
+                                daemon=True)
+               for number in range(args.sessions)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print_report(results, time.monotonic() - start, profiles)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import os
+from datetime import date, timedelta
+import pandas as pd
+import analytics
+
+# Upper bound on the prompt size sent to Gemini
+TOKEN_BUDGET = int(os.getenv('REPORT_PROMPT_TOKENS', '800'))
+
+# Months of history shown in the trend section
+TREND_MONTHS = 12
+
+# Days before the newest expense that count as "recent" for merchants and outliers
+RECENT_DAYS = 90
+
+# Expenses this many standard deviations above their category mean are outliers
+OUTLIER_Z = 3.0
+
+# Most lines listed for top descriptions and for outliers
+TOP_N = 10
+
+INSTRUCTIONS = (
+    'Please create a financial report summarizing my expenses and how much I can save from my salary. '
+    'Include insights on spending patterns, possible savings, and suggestions on managing finances better.'
+)
+
+# Rough token count; Gemini averages about four characters per token for this kind of text
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def money(value):
+    return f'{value:,.0f}'
+
+# One line per category: total, count and share of all spending
+def category_lines(summary):
+    if summary.empty:
+        return []
+    share = summary['total_amount'] / summary['total_amount'].sum() * 100
+    summary = summary.assign(share=share).sort_values('total_amount', ascending=False)
+    return [f"{row.category}: {money(row.total_amount)} in {row.expense_count} expenses ({row.share:.0f}%)"
+            for row in summary.itertuples()]
+
+# Monthly totals with month-over-month change, newest month first
+def trend_lines(monthly):
+    if monthly.empty:
+        return []
+    # Dates outside ISO format cannot be placed on the calendar
+    monthly = monthly[monthly['date'].str.match(r'\d{4}-\d{2}')]
+    if monthly.empty:
+        return []
+    totals = monthly.pivot_table(index='date', columns='category', values='amount', aggfunc='sum', fill_value=0)
+    # Months without spending count as zero, so every change is against the month before
+    months = pd.period_range(totals.index.min()[:7], totals.index.max()[:7], freq='M').strftime('%Y-%m-01')
+    totals = totals.reindex(months, fill_value=0).tail(TREND_MONTHS + 1)
+    overall = totals.sum(axis=1)
+    change = (overall.pct_change() * 100).replace([float('inf'), float('-inf')], float('nan'))
+    # Category that moved the most against the previous month
+    delta = totals.diff().iloc[1:]
+    mover = delta.abs().idxmax(axis=1)
+
+    lines = []
+    for month in reversed(overall.index):
+        line = f'{month[:7]}: {money(overall[month])}'
+        # An empty month after an empty month has nothing to compare
+        if month in mover.index and delta.loc[month, mover[month]] != 0:
+            category = mover[month]
+            trend = f'{change[month]:+.0f}% MoM, ' if pd.notna(change[month]) else ''
+            line += f' ({trend}biggest move {category} {delta.loc[month, category]:+,.0f})'
+        lines.append(line)
+    return lines
+
+# Descriptions with the highest recent spend
+def merchant_lines(merchants):
+    return [f'{row.description}: {money(row.total_amount)} over {row.expense_count} expenses'
+            for row in merchants.itertuples()]
+
+# Single recent expenses far above their category's usual amount
+def outlier_lines(largest, stats):
+    if largest.empty or stats.empty:
+        return []
+    candidates = largest.merge(stats, on='category')
+    # Columns stacked from several partitions can arrive as object; nlargest needs numbers
+    numeric = ['amount', 'mean', 'std']
+    candidates[numeric] = candidates[numeric].apply(pd.to_numeric, errors='coerce')
+    candidates['z'] = (candidates['amount'] - candidates['mean']) / candidates['std'].where(candidates['std'] > 0)
+    outliers = candidates[candidates['z'] >= OUTLIER_Z].nlargest(TOP_N, 'z')
+    return [f"{row.date} {row.category} {money(row.amount)} '{row.description}' "
+            f"({row.z:.1f} sd above the usual {money(row.mean)})"
+            for row in outliers.itertuples()]
+
+# Lines for one section; a failing query leaves the section out instead of failing the whole report
+def section_lines(build):
+    try:
+        return build()
+    except Exception as e:
+        print(f'Report section skipped: {e}')
+        return []
+
+# Gather the statistics; every query returns aggregates, so cost does not grow with the prompt
+def collect_sections():
+    sections = [
+        ('Spending by category (all time)', section_lines(lambda: category_lines(analytics.category_summary()))),
+        ('Monthly totals, newest first', section_lines(lambda: trend_lines(analytics.time_buckets('month')))),
+    ]
+
+    # Recent sections count back from the newest expense; without one there is nothing recent to show
+    latest = analytics.latest_date()
+    if not latest:
+        return sections
+    recent_start = (date.fromisoformat(latest[:10]) - timedelta(days=RECENT_DAYS)).isoformat()
+
+    return sections + [
+        (f'Top descriptions, last {RECENT_DAYS} days',
+         section_lines(lambda: merchant_lines(analytics.top_descriptions(recent_start, TOP_N)))),
+        (f'Unusual expenses, last {RECENT_DAYS} days',
+         section_lines(lambda: outlier_lines(analytics.largest_expenses(recent_start),
+                                             analytics.category_stats(recent_start)))),
+    ]
+
+# Build the report prompt, adding lines section by section until the budget runs out
+def build_prompt(salary, token_budget=TOKEN_BUDGET, sections=None):
+    header = f'My monthly salary is: {salary}\nI have the following expenses summary:'
+    footer = INSTRUCTIONS
+    used = estimate_tokens(header) + estimate_tokens(footer)
+
+    parts = [header]
+    for title, lines in (sections if sections is not None else collect_sections()):
+        if not lines:
+            continue
+        heading = f'\n{title}:'
+        lines = [f'- {line}' for line in lines]
+        if used + estimate_tokens(heading) + estimate_tokens(lines[0]) > token_budget:
+            # A later, shorter section may still fit
+            continue
+        parts.append(heading)
+        used += estimate_tokens(heading)
+        # Lines are ordered by importance, so whatever is cut is the least useful
+        for line in lines:
+            cost = estimate_tokens(line)
+            if used + cost > token_budget:
+                break
+            parts.append(line)
+            used += cost
+
+    parts.append('\n' + footer)
+    return '\n'.join(parts)
@@ -1,53 +1,156 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
+import database
+import bulk_delete
+import archive
+import expense_search
 
 # Create or connect to an SQLite database
-conn = sqlite3.connect('expenses.db', check_same_thread=False)
+conn = database.connect()
+database.init_db(conn)
 c = conn.cursor()
 
+# Archive closed years and purge old tombstones in the background
+bulk_delete.start_compactor(database.connect)
+
+CATEGORIES = ['Food', 'Transport', 'Utilities', 'Entertainment', 'Stocks/Mutual Fund', 'Others']
+
+SEARCH_PAGE_SIZE = 20
+
+# Fetch the expenses that have not been deleted
+def get_expenses():
+    c.execute('SELECT id, category, amount, description, date FROM expenses WHERE deleted_at IS NULL')
+    return pd.DataFrame(c.fetchall(), columns=['ID', 'Category', 'Amount', 'Description', 'Date'])
+
+# Offer to restore the most recent delete
+def show_undo():
+    last_delete = st.session_state.get('last_delete')
+    if not last_delete:
+        return
+
+    token, count = last_delete
+    st.info(f'{count} expenses were deleted.')
+    if st.button('Undo Delete'):
+        restored = bulk_delete.undo_delete(conn, token)
+        st.session_state['last_delete'] = None
+        st.success(f'{restored} expenses have been restored.')
+        st.rerun()
+
+# Delete everything matching a date range, category or import batch
+def show_filter_delete():
+    with st.expander('Delete by filter'):
+        use_dates = st.checkbox('Filter by date range')
+        start_date, end_date = None, None
+        if use_dates:
+            start_date = st.date_input('From')
+            end_date = st.date_input('To')
+        categories = st.multiselect('Categories', CATEGORIES)
+        import_batch = st.selectbox('Import batch', [''] + bulk_delete.list_import_batches(conn))
+
+        filters = {
+            'start_date': start_date,
+            'end_date': end_date,
+            'categories': categories,
+            'import_batch': import_batch,
+        }
+
+        try:
+            matching = bulk_delete.count_matching(conn, **filters)
+        except ValueError:
+            st.caption('Choose at least one filter.')
+            return
+
+        st.write(f'{matching} expenses match this filter.')
+        archived = bulk_delete.count_archived(conn, **filters)
+        if archived:
+            st.info(f'{archived} more matching expenses are in archived years, which are read-only and will not be deleted.')
+        if st.button('Delete Matching Expenses', disabled=matching == 0):
+            token, count = bulk_delete.soft_delete(conn, **filters)
+            st.session_state['last_delete'] = (token, count)
+            st.rerun()
+
+# Browse one archived year; archived expenses can be viewed and searched but not deleted
+def show_archive():
+    partitions = archive.list_partitions(conn)
+    if not partitions:
+        return
+
+    with st.expander('Archived years (read-only)'):
+        names = {f'{start_date[:4]} ({row_count} expenses)': path
+                 for name, path, start_date, end_date, row_count in partitions}
+        choice = st.selectbox('Archived year', list(names))
+        cold = archive.open_partition(names[choice])
+        try:
+            rows = cold.execute('SELECT id, category, amount, description, date FROM expenses ORDER BY date, id').fetchall()
+        finally:
+            cold.close()
+        st.dataframe(pd.DataFrame(rows, columns=['ID', 'Category', 'Amount', 'Description', 'Date']))
+
+# Ranked, paginated search over expense descriptions
+def show_search(query):
+    page = st.session_state.get('search_page', 1)
+    results, total = expense_search.search_expenses(conn, query, page, SEARCH_PAGE_SIZE)
+
+    if total == 0:
+        st.warning('No expenses match your search.')
+        return
+
+    # The page widget's value is read from session state on the next run; only the capped matches are paged
+    pages = (min(total, expense_search.MATCH_LIMIT) + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    if page > pages:
+        # Results shrank since the page was picked, e.g. after a delete
+        page = st.session_state['search_page'] = pages
+        results, total = expense_search.search_expenses(conn, query, page, SEARCH_PAGE_SIZE)
+    st.number_input('Page', min_value=1, max_value=pages, step=1, key='search_page')
+
+    count = f'{expense_search.MATCH_LIMIT}+' if total > expense_search.MATCH_LIMIT else total
+    st.caption(f'{count} matching expenses, page {page} of {pages}')
+    st.dataframe(results)
+    if results['Archived'].any():
+        st.caption('Archived expenses are read-only.')
+
 def app():
     if 'username' not in st.session_state or st.session_state['username'] == '':
         st.warning('Please login first to view your expenses.')
-        return 
+        return
 
     st.title('View Expenses - ' + st.session_state['username'])
 
     try:
-        c.execute('SELECT id, category, amount, description, date FROM expenses')
-        expenses = c.fetchall()
+        show_undo()
+
+        query = st.text_input('Search descriptions', placeholder='e.g. cab to airport')
+        if query != st.session_state.get('search_query', '') or 'search_page' not in st.session_state:
+            # A new search starts from the first page
+            st.session_state['search_query'] = query
+            st.session_state['search_page'] = 1
+        if query.strip():
+            show_search(query)
+            return
 
-        if len(expenses) > 0:
-            df = pd.DataFrame(expenses, columns=['ID', 'Category', 'Amount', 'Description', 'Date'])
+        df = get_expenses()
 
+        if len(df) > 0:
             # Display the expense data in the table
-            table_placeholder = st.empty()
-            table_placeholder.dataframe(df)
+            st.dataframe(df)
 
             # Use multiselect to allow multiple expense selections
             expenses_to_delete = st.multiselect('Select expenses to delete:', df['ID'].tolist())
 
             if st.button('Delete Selected Expenses'):
                 if expenses_to_delete:
-                    # Delete all selected expenses
-                    c.executemany('DELETE FROM expenses WHERE id = ?', [(expense_id,) for expense_id in expenses_to_delete])
-                    conn.commit()
-                    st.success(f'{len(expenses_to_delete)} expenses have been deleted.')
-
-                    # Clear the previous table and show the updated table
-                    table_placeholder.empty()  # Clear the previous table
-
-                    # Fetch the updated expenses list after deletion
-                    c.execute('SELECT id, category, amount, description, date FROM expenses')
-                    expenses = c.fetchall()
-                    df = pd.DataFrame(expenses, columns=['ID', 'Category', 'Amount', 'Description', 'Date'])
-
-                    # Display the updated dataframe in place of the old one
-                    table_placeholder.dataframe(df)
+                    # Tombstone all selected expenses in one statement so the delete can be undone
+                    token, count = bulk_delete.soft_delete(conn, ids=expenses_to_delete)
+                    st.session_state['last_delete'] = (token, count)
+                    st.rerun()
                 else:
                     st.warning('Please select at least one expense to delete.')
+
+            show_filter_delete()
         else:
             st.warning('No expenses found.')
 
+        show_archive()
+
     except Exception as e:
         st.error(f"An error occurred: {e}")
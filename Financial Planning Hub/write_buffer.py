@@ -0,0 +1,115 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+import database
+
+# Longest a submitted expense waits for other writes to join its commit
+FLUSH_INTERVAL = 0.005
+
+# A commit is issued as soon as this many expenses are waiting
+MAX_BATCH = 256
+
+# How long a page waits for its expense to be committed: one busy timeout for the batch
+# ahead of it and one for its own
+ACK_TIMEOUT = 2 * database.DATABASE_TIMEOUT
+
+# Errors caused by one row's values; anything else (e.g. a locked database) fails the whole batch
+ROW_ERRORS = (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.DataError)
+
+INSERT_SQL = 'INSERT INTO expenses (category, amount, description, date, import_batch) VALUES (?, ?, ?, ?, ?)'
+
+# Collects inserts from every session and writes them in group commits
+class WriteBuffer:
+
+    def __init__(self, connect=database.connect, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.connect = connect
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.pending = queue.Queue()
+        threading.Thread(target=self.run, name='expense-writer', daemon=True).start()
+
+    def submit(self, category, amount, description, date, import_batch=None):
+        """Queue an expense; the returned future resolves to its id once it is committed."""
+        future = Future()
+        self.pending.put(((category, amount, description, date, import_batch), future))
+        return future
+
+    def add_expense(self, category, amount, description, date, import_batch=None, timeout=ACK_TIMEOUT):
+        """Insert an expense and block until it is durably committed."""
+        future = self.submit(category, amount, description, date, import_batch)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # Still queued: withdraw it, so it is not committed after the page reported a failure
+            if future.cancel():
+                raise
+            # Already being written; its outcome is at most one busy timeout away
+            return future.result()
+
+    def run(self):
+        # Only this thread writes through the buffer, so there is a single writer connection
+        conn = self.connect()
+        # In WAL mode synchronous=NORMAL may lose the last commits on power loss; FULL makes the ack durable
+        conn.execute('PRAGMA synchronous=FULL')
+
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.flush(conn, batch)
+
+    def flush(self, conn, batch):
+        # Expenses whose page stopped waiting were cancelled and must not be written
+        batch = [(row, future) for row, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        try:
+            with conn:
+                ids = [conn.execute(INSERT_SQL, row).lastrowid for row, _ in batch]
+        except ROW_ERRORS:
+            # One bad row must not fail everyone else's expense; retry them one by one
+            self.flush_rows(conn, batch)
+            return
+        except Exception as e:
+            # Retrying row by row would only wait out the same lock once per row
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), expense_id in zip(batch, ids):
+            future.set_result(expense_id)
+
+    def flush_rows(self, conn, batch):
+        for index, (row, future) in enumerate(batch):
+            try:
+                with conn:
+                    expense_id = conn.execute(INSERT_SQL, row).lastrowid
+            except ROW_ERRORS as e:
+                future.set_exception(e)
+                continue
+            except Exception as e:
+                for _, rest in batch[index:]:
+                    rest.set_exception(e)
+                return
+            future.set_result(expense_id)
+
+_lock = threading.Lock()
+_buffer = None
+
+# Shared buffer for all sessions in this process
+def get_buffer():
+    global _buffer
+    with _lock:
+        if _buffer is None:
+            _buffer = WriteBuffer()
+        return _buffer